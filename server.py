@@ -6,24 +6,99 @@ Camera to clipboard: Snap a photo → Ctrl+V on your computer.
 Works on Mac, Windows, and Linux. 100% private via your own WiFi.
 """
 
+import base64
+import errno
+import functools
+import gzip
+import hashlib
+import heapq
 import http.server
+import io
 import os
 import socket
 import platform
+import re
 import json
+import struct
+import logging
+import logging.handlers
+import queue
+import sys
 import urllib.parse
 import mimetypes
+import mmap
 import subprocess
 import tempfile
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import orjson  # Optional: much faster JSON for large listings and sync messages
+except ImportError:
+    orjson = None
+
+try:
+    from watchdog.observers import Observer  # Optional: push-based /files refresh
+except ImportError:
+    Observer = None
+
+try:
+    from PIL import Image as PILImage  # Optional: native Windows clipboard path
+except ImportError:
+    PILImage = None
+
 PORT = 8766
 SYSTEM = platform.system()
 DOWNLOADS_FOLDER = str(Path.home() / "Downloads")
+CHUNK_SIZE = 1024 * 1024  # 1 MiB buffer for streaming uploads
+RESPONSE_BUFFER_SIZE = 96 * 1024  # Headers + in-memory body (page, /files) go out in one send
+MAX_WORKERS = 32  # Requests handled concurrently
+WORKER_WAIT_TIMEOUT = 10  # Seconds a request waits for a worker before a 503
+IDLE_TIMEOUT = 60  # Seconds before an idle keep-alive connection is dropped
+MMAP_MIN_SIZE = 64 * 1024  # Downloads in this range are mmap'd when sendfile is unavailable
+MMAP_MAX_SIZE = 64 * 1024 * 1024
+UPLOAD_EXPIRY = 60 * 60  # Seconds an idle chunked upload is kept for resuming
+UPLOAD_SWEEP_INTERVAL = 10 * 60  # Seconds between sweeps for abandoned uploads
+
+FILES_CACHE_TTL = 2.0  # Seconds a /files listing may be reused
+MAX_LISTED_FILES = 500  # Cap on entries returned by /files
+GZIP_MIN_SIZE = 1024  # Smaller responses aren't worth compressing
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'  # RFC 6455 handshake constant
+WS_MAX_MESSAGE = 64 * 1024 * 1024  # Largest /sync message (a clipboard photo)
+WS_TEXT, WS_BINARY, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+# Request threads only enqueue log records; a listener thread writes them out
+log = logging.getLogger('phone_pc_sync')
 
 # In-memory text sync storage
 synced_text = ""
+synced_text_version = 0  # Bumped on every change; /sync diffs name the version they edit
+synced_text_lock = threading.Lock()
+sync_sockets = set()  # Open /sync WebSockets, guarded by synced_text_lock
+
+# (bytes received so far, time.monotonic() of the last chunk) per chunked
+# upload, keyed by its temp file
+upload_offsets = {}
+# (total size, time.monotonic() of completion) per finished chunked upload, so
+# a client that lost the last response can still learn the upload is done
+completed_uploads = {}
+upload_offsets_lock = threading.Lock()  # Guards upload_offsets and completed_uploads
+
+# Cached /files response, invalidated by Downloads mtime or TTL
+files_cache_lock = threading.Lock()
+files_cache_json = None
+files_cache_gzip = None
+files_cache_mtime = -1
+files_cache_time = 0.0
+# Every rescan takes the next generation; a rescan that started before the
+# stored listing (or before the last invalidation) must not replace it
+files_cache_generation = 0
+files_cache_stored_generation = 0
+files_cache_dirty = threading.Event()
+files_watched = False  # True once a watchdog observer keeps the cache current
 
 # File type icons for the UI
 FILE_ICONS = {
@@ -37,372 +112,661 @@ FILE_ICONS = {
     'default': '📄'
 }
 
+# Partial downloads from browsers/tools, hidden from the listing until complete
+INCOMPLETE_SUFFIXES = ('.crdownload', '.part', '.tmp', '.download', '.partial')
+
+# Extension -> icon lookup, flattened once at import time
+EXT_ICONS = {
+    **dict.fromkeys(('jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'bmp', 'ico'), FILE_ICONS['image']),
+    **dict.fromkeys(('mp4', 'mov', 'avi', 'mkv', 'webm', 'm4v'), FILE_ICONS['video']),
+    **dict.fromkeys(('mp3', 'wav', 'flac', 'aac', 'm4a', 'ogg'), FILE_ICONS['audio']),
+    'pdf': FILE_ICONS['pdf'],
+    **dict.fromkeys(('rtf', 'odt'), FILE_ICONS['document']),
+    **dict.fromkeys(('csv', 'xlsx', 'xls'), '📊'),  # Spreadsheet
+    **dict.fromkeys(('doc', 'docx'), '📘'),  # Word doc
+    'md': '📋',  # Markdown
+    'txt': '📝',  # Text
+    **dict.fromkeys(('zip', 'rar', '7z', 'tar', 'gz', 'bz2'), FILE_ICONS['archive']),
+    **dict.fromkeys(('py', 'js', 'ts', 'tsx', 'jsx', 'html', 'css', 'json', 'xml', 'yaml', 'yml',
+                     'sh', 'bat', 'java', 'c', 'cpp', 'h', 'hpp', 'go', 'rs', 'rb', 'php', 'sql',
+                     'swift', 'kt', 'kts', 'toml', 'ini', 'conf', 'vue', 'svelte', 'scss', 'sass',
+                     'less', 'r', 'lua', 'pl', 'pm', 'ps1', 'psm1', 'dockerfile', 'makefile'),
+                    FILE_ICONS['code']),
+}
+
+# Extension -> MIME type, snapshotted once instead of calling guess_type per download
+mimetypes.init()
+MIME_TYPES = {ext[1:]: mime for ext, mime in mimetypes.types_map.items()}
+
+def get_extension(filename):
+    """Lowercase extension without the dot, or '' if there is none."""
+    i = filename.rfind('.')
+    return filename[i + 1:].lower() if i >= 0 else ''
+
 def get_file_icon(filename):
     """Get appropriate icon for file type."""
-    ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    
-    # Incomplete/temporary download files
-    if ext in ['crdownload', 'part', 'tmp', 'download', 'partial']:
-        return '⏳'  # In progress
-    
-    if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'bmp', 'ico']:
-        return FILE_ICONS['image']
-    elif ext in ['mp4', 'mov', 'avi', 'mkv', 'webm', 'm4v']:
-        return FILE_ICONS['video']
-    elif ext in ['mp3', 'wav', 'flac', 'aac', 'm4a', 'ogg']:
-        return FILE_ICONS['audio']
-    elif ext == 'pdf':
-        return FILE_ICONS['pdf']
-    elif ext in ['doc', 'docx', 'txt', 'rtf', 'odt', 'md', 'csv', 'xlsx', 'xls']:
-        # Differentiate document types
-        if ext in ['csv', 'xlsx', 'xls']:
-            return '📊'  # Spreadsheet
-        elif ext in ['doc', 'docx']:
-            return '📘'  # Word doc
-        elif ext == 'md':
-            return '📋'  # Markdown
-        elif ext == 'txt':
-            return '📝'  # Text
-        else:
-            return FILE_ICONS['document']
-    elif ext in ['zip', 'rar', '7z', 'tar', 'gz', 'bz2']:
-        return FILE_ICONS['archive']
-    elif ext in ['py', 'js', 'ts', 'tsx', 'jsx', 'html', 'css', 'json', 'xml', 'yaml', 'yml', 
-                  'sh', 'bat', 'java', 'c', 'cpp', 'h', 'hpp', 'go', 'rs', 'rb', 'php', 'sql',
-                  'swift', 'kt', 'kts', 'toml', 'ini', 'conf', 'vue', 'svelte', 'scss', 'sass',
-                  'less', 'r', 'lua', 'pl', 'pm', 'ps1', 'psm1', 'dockerfile', 'makefile']:
-        return FILE_ICONS['code']
-    else:
-        return FILE_ICONS['default']
+    return EXT_ICONS.get(get_extension(filename), FILE_ICONS['default'])
 
 
-def copy_image_to_clipboard(image_path):
-    """Copy an image to clipboard. Returns (success, error_message)."""
+# Native clipboard bindings, loaded once. Each is None when unavailable,
+# in which case copy_image_to_clipboard falls back to a helper process.
+NSData = NSPasteboard = NSImage = None
+user32 = kernel32 = None
+if SYSTEM == 'Darwin':
+    try:
+        from AppKit import NSData, NSPasteboard, NSImage  # pyobjc
+    except ImportError:
+        pass
+elif SYSTEM == 'Windows' and PILImage is not None:
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.WinDLL('user32', use_last_error=True)
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+    kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+    kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+    kernel32.GlobalLock.restype = wintypes.LPVOID
+    kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+    kernel32.GlobalFree.argtypes = [wintypes.HGLOBAL]
+    user32.OpenClipboard.argtypes = [wintypes.HWND]
+    user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+    user32.SetClipboardData.restype = wintypes.HANDLE
+
+CF_DIB = 8
+GMEM_MOVEABLE = 0x0002
+
+
+def copy_image_native_mac(image_data):
+    """Copy image bytes with NSPasteboard in-process. Returns True on success."""
+    data = NSData.dataWithBytes_length_(image_data, len(image_data))
+    image = NSImage.alloc().initWithData_(data)
+    if image is None:
+        return False
+    pasteboard = NSPasteboard.generalPasteboard()
+    pasteboard.clearContents()
+    return bool(pasteboard.writeObjects_([image]))
+
+
+def copy_image_native_windows(image_data):
+    """Copy image bytes as CF_DIB through user32. Returns True on success."""
+    with PILImage.open(io.BytesIO(image_data)) as img:
+        out = io.BytesIO()
+        img.convert('RGB').save(out, 'BMP')
+    dib = out.getvalue()[14:]  # Strip the BITMAPFILEHEADER
+    
+    handle = kernel32.GlobalAlloc(GMEM_MOVEABLE, len(dib))
+    if not handle:
+        return False
+    ptr = kernel32.GlobalLock(handle)
+    ctypes.memmove(ptr, dib, len(dib))
+    kernel32.GlobalUnlock(handle)
+    
+    if not user32.OpenClipboard(None):
+        kernel32.GlobalFree(handle)
+        return False
+    try:
+        user32.EmptyClipboard()
+        if not user32.SetClipboardData(CF_DIB, handle):
+            kernel32.GlobalFree(handle)
+            return False
+    finally:
+        user32.CloseClipboard()
+    # The clipboard owns the memory once SetClipboardData succeeds
+    return True
+
+
+def copy_image_mac(image_path):
+    """Copy an image to the macOS clipboard."""
+    # Use TIFF format which works for both PNG and JPEG
+    applescript = f'''
+    set theFile to POSIX file "{image_path}"
+    set theImage to read theFile as TIFF picture
+    set the clipboard to theImage
+    '''
+    result = subprocess.run(
+        ['osascript', '-e', applescript],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode == 0:
+        return True, None
+
+    # Fallback: using NSPasteboard via AppleScript
+    fallback_script = f'''
+    use framework "AppKit"
+    set theImage to current application's NSImage's alloc()'s initWithContentsOfFile:"{image_path}"
+    set thePasteboard to current application's NSPasteboard's generalPasteboard()
+    thePasteboard's clearContents()
+    thePasteboard's writeObjects:{{theImage}}
+    '''
+    result2 = subprocess.run(
+        ['osascript', '-e', fallback_script],
+        capture_output=True,
+        text=True
+    )
+    if result2.returncode == 0:
+        return True, None
+    return False, result.stderr
+
+
+def copy_image_windows(image_path):
+    """Copy an image to the Windows clipboard."""
+    # PowerShell command to copy image to clipboard
+    ps_script = f'''
+    Add-Type -AssemblyName System.Windows.Forms
+    $image = [System.Drawing.Image]::FromFile("{image_path}")
+    [System.Windows.Forms.Clipboard]::SetImage($image)
+    '''
+    result = subprocess.run(
+        ['powershell', '-Command', ps_script],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode == 0:
+        return True, None
+    return False, result.stderr
+
+
+def guess_image_type(image_path):
+    """MIME type of an image file from its leading bytes (PNG if unknown)."""
+    with open(image_path, 'rb') as f:
+        header = f.read(12)
+    if header.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/png'
+
+
+def copy_image_linux(image_path):
+    """Copy an image to the X11 clipboard via xclip/xsel."""
+    mime_type = guess_image_type(image_path)
+    # Use xclip for Linux (most common)
     try:
-        if SYSTEM == 'Darwin':  # macOS
-            # Use TIFF format which works for both PNG and JPEG
-            applescript = f'''
-            set theFile to POSIX file "{image_path}"
-            set theImage to read theFile as TIFF picture
-            set the clipboard to theImage
-            '''
+        with open(image_path, 'rb') as f:
             result = subprocess.run(
-                ['osascript', '-e', applescript],
-                capture_output=True,
-                text=True
+                ['xclip', '-selection', 'clipboard', '-t', mime_type, '-i'],
+                stdin=f,
+                capture_output=True
             )
-            if result.returncode == 0:
-                return True, None
-            
-            # Fallback: using NSPasteboard via AppleScript
-            fallback_script = f'''
-            use framework "AppKit"
-            set theImage to current application's NSImage's alloc()'s initWithContentsOfFile:"{image_path}"
-            set thePasteboard to current application's NSPasteboard's generalPasteboard()
-            thePasteboard's clearContents()
-            thePasteboard's writeObjects:{{theImage}}
-            '''
-            result2 = subprocess.run(
-                ['osascript', '-e', fallback_script],
-                capture_output=True,
-                text=True
-            )
-            if result2.returncode == 0:
-                return True, None
-            return False, result.stderr
-            
-        elif SYSTEM == 'Windows':
-            # PowerShell command to copy image to clipboard
-            ps_script = f'''
-            Add-Type -AssemblyName System.Windows.Forms
-            $image = [System.Drawing.Image]::FromFile("{image_path}")
-            [System.Windows.Forms.Clipboard]::SetImage($image)
-            '''
+        if result.returncode == 0:
+            return True, None
+    except FileNotFoundError:
+        pass
+
+    # Try xsel as fallback
+    try:
+        with open(image_path, 'rb') as f:
             result = subprocess.run(
-                ['powershell', '-Command', ps_script],
-                capture_output=True,
-                text=True
+                ['xsel', '--clipboard', '--input', '--type', mime_type],
+                stdin=f,
+                capture_output=True
             )
-            if result.returncode == 0:
-                return True, None
-            return False, result.stderr
-            
-        elif SYSTEM == 'Linux':
-            # Use xclip for Linux (most common)
-            try:
-                with open(image_path, 'rb') as f:
-                    result = subprocess.run(
-                        ['xclip', '-selection', 'clipboard', '-t', 'image/png', '-i'],
-                        stdin=f,
-                        capture_output=True
-                    )
-                if result.returncode == 0:
-                    return True, None
-            except FileNotFoundError:
-                pass
-            
-            # Try xsel as fallback
-            try:
-                with open(image_path, 'rb') as f:
-                    result = subprocess.run(
-                        ['xsel', '--clipboard', '--input', '--type', 'image/png'],
-                        stdin=f,
-                        capture_output=True
-                    )
-                if result.returncode == 0:
-                    return True, None
-            except FileNotFoundError:
-                pass
-            
-            return False, "Install xclip: sudo apt install xclip"
-            
-        else:
-            return False, f"Unsupported OS: {SYSTEM}"
-            
+        if result.returncode == 0:
+            return True, None
+    except FileNotFoundError:
+        pass
+
+    return False, "Install xclip: sudo apt install xclip"
+
+
+def copy_image_unsupported(image_path):
+    """Clipboard copy is not available on this OS."""
+    return False, f"Unsupported OS: {SYSTEM}"
+
+
+# Platform implementation, picked once since SYSTEM never changes at runtime
+copy_image_for_platform = {
+    'Darwin': copy_image_mac,
+    'Windows': copy_image_windows,
+    'Linux': copy_image_linux,
+}.get(SYSTEM, copy_image_unsupported)
+
+
+def copy_image_to_clipboard(image_path):
+    """Copy an image to clipboard. Returns (success, error_message)."""
+    try:
+        return copy_image_for_platform(image_path)
     except Exception as e:
         return False, str(e)
 
+
+# In-process copy from bytes (no temp file, no helper process), or None
+if NSPasteboard is not None:
+    copy_image_native = copy_image_native_mac
+elif user32 is not None:
+    copy_image_native = copy_image_native_windows
+else:
+    copy_image_native = None
+
+
+def copy_image_data_to_clipboard(image_data):
+    """Copy in-memory image bytes to clipboard. Returns (success, error_message)."""
+    if copy_image_native is not None:
+        try:
+            if copy_image_native(image_data):
+                return True, None
+        except Exception as e:
+            log.warning("⚠️ Native clipboard failed, using helper process: %s", e)
+    
+    with tempfile.NamedTemporaryFile(prefix='clipboard_photo_', suffix='.png', delete=False) as f:
+        f.write(image_data)
+    try:
+        return copy_image_to_clipboard(f.name)
+    finally:
+        os.unlink(f.name)
+
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
 def format_file_size(size_bytes):
     """Format file size in human readable format."""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024:
-            return f"{size_bytes:.1f} {unit}" if unit != 'B' else f"{size_bytes} {unit}"
-        size_bytes /= 1024
-    return f"{size_bytes:.1f} TB"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    # Each unit is 2**10 of the previous one, so bit_length picks it directly
+    exp = min((size_bytes.bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (exp * 10)):.1f} {SIZE_UNITS[exp]}"
+
+def is_listed_name(name):
+    """False for hidden files/folders and downloads still in progress."""
+    return not (name.startswith('.') or name.endswith(INCOMPLETE_SUFFIXES))
 
 def get_files_list():
-    """Get list of files in Downloads folder."""
+    """Get list of files in Downloads folder, newest first."""
     files = []
     try:
-        for entry in os.scandir(DOWNLOADS_FOLDER):
-            # Skip hidden files/folders (starting with .)
-            if entry.name.startswith('.'):
-                continue
-            if entry.is_file():
-                stat = entry.stat()
-                files.append({
-                    'name': entry.name,
-                    'size': stat.st_size,
-                    'size_formatted': format_file_size(stat.st_size),
-                    'modified': stat.st_mtime,
-                    'icon': get_file_icon(entry.name)
-                })
-        # Sort by modification time, newest first
-        files.sort(key=lambda x: x['modified'], reverse=True)
+        entries = []
+        with os.scandir(DOWNLOADS_FOLDER) as it:
+            for entry in it:
+                # Name-only filters first, before any stat call
+                name = entry.name
+                if not is_listed_name(name):
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        # Only the newest MAX_LISTED_FILES are sent
+        for mtime, name, size in heapq.nlargest(MAX_LISTED_FILES, entries):
+            files.append({
+                'name': name,
+                'href': '/download/' + urllib.parse.quote(name, safe=''),
+                'size': size,
+                'modified': mtime,
+                'icon': get_file_icon(name)
+            })
     except Exception as e:
-        print(f"Error listing files: {e}")
+        log.error("Error listing files: %s", e)
     return files
 
 
-class FileTransferHandler(http.server.BaseHTTPRequestHandler):
-    def do_POST(self):
-        """Handle file upload and text sync."""
-        global synced_text
-        parsed = urllib.parse.urlparse(self.path)
-        path = parsed.path
-        
-        # Handle text sync
-        if path == '/text':
-            try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    text_data = self.rfile.read(content_length).decode('utf-8')
-                    synced_text = text_data
-                    print(f"📝 Text synced: {len(text_data)} characters")
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({'success': True, 'length': len(synced_text)}).encode())
-            except Exception as e:
-                print(f"❌ Text sync error: {e}")
-                self.send_error(500, str(e))
-            return
-        
-        # Handle clipboard image (camera paster feature)
-        if path == '/clipboard':
-            try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                
-                if content_length == 0:
-                    self.send_error(400, "No image data received")
-                    return
-                
-                # Read the image data
-                image_data = self.rfile.read(content_length)
-                
-                # Save to temp file
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                temp_path = os.path.join(tempfile.gettempdir(), f"clipboard_photo_{timestamp}.png")
-                
-                with open(temp_path, 'wb') as f:
-                    f.write(image_data)
-                
-                # Copy to clipboard (cross-platform)
-                success, error = copy_image_to_clipboard(temp_path)
-                
-                if success:
-                    print(f"✅ Photo copied to clipboard! ({len(image_data)} bytes)")
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/plain')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(b"Photo copied to clipboard!")
-                else:
-                    print(f"❌ Clipboard error: {error}")
-                    self.send_error(500, f"Clipboard error: {error}")
-                    
-            except Exception as e:
-                print(f"❌ Clipboard error: {e}")
-                self.send_error(500, str(e))
-            return
-        
-        try:
-            content_type = self.headers.get('Content-Type', '')
-            content_length = int(self.headers.get('Content-Length', 0))
-            
-            if content_length == 0:
-                self.send_error(400, "No file data received")
-                return
-            
-            # Get filename from header or generate one
-            filename = self.headers.get('X-Filename', '')
-            if filename:
-                filename = urllib.parse.unquote(filename)
-            else:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"phone_file_{timestamp}"
-            
-            # Sanitize filename
-            filename = os.path.basename(filename)
-            
-            # Read file data
-            file_data = self.rfile.read(content_length)
-            
-            # Save to Downloads folder (overwrite if exists)
-            file_path = os.path.join(DOWNLOADS_FOLDER, filename)
-            
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
-            
-            saved_name = os.path.basename(file_path)
-            print(f"✅ File saved: {saved_name} ({format_file_size(len(file_data))})")
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({
-                'success': True,
-                'filename': saved_name,
-                'size': len(file_data)
-            }).encode())
-            
-        except Exception as e:
-            print(f"❌ Upload error: {e}")
-            self.send_error(500, str(e))
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+UPLOAD_TEMP_RE = re.compile(r'\..+\.[A-Za-z0-9_-]{1,64}\.part$')
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}$')
+
+def parse_byte_range(header, file_size):
+    """Parse a single-range 'bytes=a-b' header into inclusive (start, end).
+
+    Returns None if the header should be ignored (malformed or multi-range)
+    and raises ValueError if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if file_size == 0:
+        raise ValueError("Empty file")
     
-    def do_GET(self):
-        """Handle GET requests."""
-        parsed = urllib.parse.urlparse(self.path)
-        path = parsed.path
-        
-        if path == '/':
-            self.serve_html()
-        elif path == '/files':
-            self.serve_files_list()
-        elif path == '/text':
-            self.serve_synced_text()
-        elif path.startswith('/download/'):
-            filename = urllib.parse.unquote(path[10:])
-            self.serve_file_download(filename)
-        else:
-            self.send_error(404)
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, file_size - suffix), file_size - 1
     
-    def serve_synced_text(self):
-        """Serve the synced text."""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps({'text': synced_text}).encode())
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= file_size:
+        raise ValueError("Range starts past end of file")
+    end = int(last) if last else file_size - 1
+    return start, min(end, file_size - 1)
+
+
+def create_exclusive_temp(file_path):
+    """Atomically create a hidden temp file beside file_path. Returns (fd, temp_path)."""
+    folder, name = os.path.split(file_path)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        # Leading dot keeps in-progress uploads out of the /files listing
+        temp_path = os.path.join(folder, f".{name}.{os.urandom(4).hex()}.part")
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def chunk_temp_path(filename, upload_id):
+    """Hidden temp file that collects the chunks of one upload."""
+    return os.path.join(DOWNLOADS_FOLDER, f".{filename}.{upload_id}.part")
+
+
+def encode_json(obj):
+    """Encode obj as JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def decode_json(data):
+    """Decode JSON bytes or str, using orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def expire_stale_uploads():
+    """Forget chunked uploads idle for UPLOAD_EXPIRY and delete their temp files.
+
+    Also removes upload temp files left behind by earlier runs, whose offsets
+    were lost with the process. Files written to recently are never touched.
+    """
+    now = time.monotonic()
+    with upload_offsets_lock:
+        for temp_path, (_, last_seen) in list(upload_offsets.items()):
+            if now - last_seen > UPLOAD_EXPIRY:
+                del upload_offsets[temp_path]
+        for temp_path, (_, finished) in list(completed_uploads.items()):
+            if now - finished > UPLOAD_EXPIRY:
+                del completed_uploads[temp_path]
+        active = set(upload_offsets)
     
-    def serve_files_list(self):
-        """Serve JSON list of files."""
-        files = get_files_list()
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(files).encode())
+    cutoff = time.time() - UPLOAD_EXPIRY
+    removed = 0
+    try:
+        with os.scandir(DOWNLOADS_FOLDER) as it:
+            for entry in it:
+                if entry.path in active or not UPLOAD_TEMP_RE.match(entry.name):
+                    continue
+                try:
+                    if (entry.is_file(follow_symlinks=False)
+                            and entry.stat(follow_symlinks=False).st_mtime < cutoff):
+                        os.unlink(entry.path)
+                        removed += 1
+                except OSError:
+                    pass  # Already gone or not ours to delete
+    except OSError as e:
+        log.warning("⚠️ Could not sweep abandoned uploads: %s", e)
+    if removed:
+        log.info("🧹 Removed %d abandoned upload(s)", removed)
+
+
+def expire_stale_uploads_loop():
+    """Sweep abandoned uploads at startup and every UPLOAD_SWEEP_INTERVAL."""
+    while True:
+        expire_stale_uploads()
+        time.sleep(UPLOAD_SWEEP_INTERVAL)
+
+
+def invalidate_files_cache():
+    """Drop the cached /files listing (e.g. after an upload)."""
+    global files_cache_json, files_cache_generation, files_cache_stored_generation
+    with files_cache_lock:
+        files_cache_json = None
+        # Rescans already running may have missed the change; discard them
+        files_cache_generation += 1
+        files_cache_stored_generation = files_cache_generation
+
+
+def rebuild_files_cache(dir_mtime=-1):
+    """Rescan Downloads and store a fresh /files payload. Returns (json, gzip)."""
+    global files_cache_json, files_cache_gzip, files_cache_mtime, files_cache_time
+    global files_cache_generation, files_cache_stored_generation
+    with files_cache_lock:
+        files_cache_generation += 1
+        generation = files_cache_generation
+    payload = encode_json(get_files_list())
+    compressed = None
+    if len(payload) >= GZIP_MIN_SIZE:
+        compressed = gzip.compress(payload, compresslevel=1)
+    with files_cache_lock:
+        if generation <= files_cache_stored_generation:
+            # A newer rescan finished first (or Downloads changed meanwhile)
+            if files_cache_json is not None:
+                return files_cache_json, files_cache_gzip
+            return payload, compressed
+        files_cache_stored_generation = generation
+        files_cache_json, files_cache_gzip = payload, compressed
+        files_cache_mtime = dir_mtime
+        files_cache_time = time.monotonic()
+    return payload, compressed
+
+
+def get_files_json():
+    """Get the /files payload as (json_bytes, gzip_bytes or None).
+
+    With a Downloads watcher running the cached payload is always current;
+    otherwise a recent listing is reused if Downloads is unchanged.
+    """
+    with files_cache_lock:
+        if files_watched and files_cache_json is not None:
+            return files_cache_json, files_cache_gzip
     
-    def serve_file_download(self, filename):
-        """Serve a file for download."""
-        # Sanitize filename to prevent directory traversal
-        filename = os.path.basename(filename)
-        file_path = os.path.join(DOWNLOADS_FOLDER, filename)
-        
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
-            self.send_error(404, "File not found")
+    try:
+        dir_mtime = os.stat(DOWNLOADS_FOLDER).st_mtime_ns
+    except OSError:
+        dir_mtime = -1
+    
+    with files_cache_lock:
+        if (files_cache_json is not None and dir_mtime == files_cache_mtime
+                and time.monotonic() - files_cache_time < FILES_CACHE_TTL):
+            return files_cache_json, files_cache_gzip
+    return rebuild_files_cache(dir_mtime)
+
+
+class DownloadsWatcher:
+    """watchdog event handler: refresh the /files cache when Downloads changes."""
+
+    # watchdog also reports 'opened' and 'closed_no_write' for plain reads
+    # (including our own downloads); those don't change the listing
+    LISTING_EVENTS = frozenset(('created', 'deleted', 'moved', 'modified', 'closed'))
+
+    def dispatch(self, event):
+        if event.event_type not in self.LISTING_EVENTS:
             return
-        
+        names = (os.path.basename(event.src_path),
+                 os.path.basename(getattr(event, 'dest_path', '') or ''))
+        # Ignore churn from hidden files and downloads still being written
+        if not any(name and is_listed_name(name) for name in names):
+            return
+        invalidate_files_cache()
+        files_cache_dirty.set()
+
+
+def refresh_files_cache_loop():
+    """Rebuild the /files payload off the request path whenever Downloads changes."""
+    while True:
+        files_cache_dirty.wait()
+        time.sleep(0.2)  # Coalesce bursts of events into one rescan
+        files_cache_dirty.clear()
+        rebuild_files_cache()
+
+
+def start_downloads_watcher():
+    """Watch Downloads with watchdog, if installed. Returns True if watching."""
+    global files_watched
+    if Observer is None:
+        return False
+    try:
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(DownloadsWatcher(), DOWNLOADS_FOLDER, recursive=False)
+        observer.start()
+    except Exception as e:
+        log.warning("⚠️ Could not watch Downloads, falling back to polling: %s", e)
+        return False
+    threading.Thread(target=refresh_files_cache_loop, daemon=True).start()
+    rebuild_files_cache()
+    files_watched = True
+    return True
+
+
+def publish_synced_text(change, source=None):
+    """Replace the synced text with change(current) and push it to /sync clients.
+
+    change runs under the lock and may return None to leave the text as is.
+    Every client except source gets the new text. Returns the new version,
+    or None if nothing changed.
+    """
+    global synced_text, synced_text_version
+    with synced_text_lock:
+        text = change(synced_text)
+        if text is None:
+            return None
+        synced_text = text
+        synced_text_version += 1
+        version = synced_text_version
+        peers = [sock for sock in sync_sockets if sock is not source]
+    message = encode_json({'type': 'text', 'value': text, 'version': version})
+    for peer in peers:
         try:
-            file_size = os.path.getsize(file_path)
-            mime_type, _ = mimetypes.guess_type(filename)
-            if not mime_type:
-                mime_type = 'application/octet-stream'
-            
-            # Encode filename for Content-Disposition header (RFC 5987 for Unicode support)
-            try:
-                # Try ASCII first
-                filename.encode('ascii')
-                content_disposition = f'attachment; filename="{filename}"'
-            except UnicodeEncodeError:
-                # Use RFC 5987 encoding for Unicode filenames
-                encoded_filename = urllib.parse.quote(filename, safe='')
-                content_disposition = f"attachment; filename*=UTF-8''{encoded_filename}"
-            
-            self.send_response(200)
-            self.send_header('Content-Type', mime_type)
-            self.send_header('Content-Length', str(file_size))
-            self.send_header('Content-Disposition', content_disposition)
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Filename')
-            self.send_header('Access-Control-Expose-Headers', 'Content-Disposition, Content-Length')
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            
-            # Stream file in chunks
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(65536)  # 64KB chunks
-                    if not chunk:
-                        break
-                    self.wfile.write(chunk)
-            
-            print(f"📤 Downloaded: {filename}")
-            
-        except Exception as e:
-            print(f"❌ Download error: {e}")
-            self.send_error(500, str(e))
-    
-    def do_OPTIONS(self):
-        """Handle CORS preflight."""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Filename')
-        self.end_headers()
+            peer.send(WS_TEXT, message)
+        except (OSError, ValueError):
+            # Gone, or its wfile was just closed; its own handler cleans up
+            pass
+    return version
+
+
+def set_synced_text(text, source=None):
+    """Store the synced text and push it to every /sync client except source."""
+    return publish_synced_text(lambda current: text, source)
+
+
+def apply_text_diff(text, at, remove, insert):
+    """Replace `remove` units at offset `at` with insert.
+
+    Offsets count UTF-16 code units, as JavaScript strings do, so the text
+    is edited in its UTF-16 form.
+    """
+    units = text.encode('utf-16-le', 'surrogatepass')
+    start = 2 * at
+    end = start + 2 * remove
+    if at < 0 or remove < 0 or end > len(units):
+        raise ValueError("Text diff out of range")
+    edited = units[:start] + insert.encode('utf-16-le', 'surrogatepass') + units[end:]
+    return edited.decode('utf-16-le', 'surrogatepass')
 
-    def serve_html(self):
-        """Serve the main HTML page."""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html; charset=utf-8')
-        self.end_headers()
 
-        html = '''<!DOCTYPE html>
+def patch_synced_text(base_version, at, remove, insert, source=None):
+    """Apply a diff made against base_version.
+
+    Returns None if the text has moved on or the diff doesn't fit it.
+    """
+    def change(current):
+        if base_version != synced_text_version:
+            return None
+        try:
+            return apply_text_diff(current, at, remove, insert)
+        except ValueError:
+            return None
+    return publish_synced_text(change, source)
+
+
+def is_json_int(value):
+    """True for a JSON integer (bool is an int subclass in Python)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def valid_sync_message(msg):
+    """True if a decoded /sync message carries the fields its type needs."""
+    if not isinstance(msg, dict):
+        return False
+    kind = msg.get('type')
+    if kind == 'text':
+        return isinstance(msg.get('value'), str)
+    if kind == 'textdiff':
+        return (is_json_int(msg.get('base')) and is_json_int(msg.get('at'))
+                and is_json_int(msg.get('remove')) and isinstance(msg.get('insert'), str))
+    return kind in ('clipboard', 'ping')
+
+
+def ws_unmask(payload, mask):
+    """XOR a client frame payload with its 4-byte mask."""
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')).to_bytes(n, 'little')
+
+
+class SyncSocket:
+    """Server end of one /sync WebSocket.
+
+    Only the owning handler thread reads; any thread may send, so writes
+    are serialized with a lock.
+    """
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.send_lock = threading.Lock()
+
+    def send(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            header = struct.pack('!BB', 0x80 | opcode, n)
+        elif n < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+        with self.send_lock:
+            self.wfile.write(header)
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+    def send_json(self, obj):
+        self.send(WS_TEXT, encode_json(obj))
+
+    def read_exact(self, n):
+        data = self.rfile.read(n)
+        if len(data) < n:
+            raise EOFError
+        return data
+
+    def receive(self):
+        """Return (opcode, payload) for the next data message, or None once closed."""
+        opcode = None
+        parts = []
+        received = 0
+        try:
+            while True:
+                b0, b1 = self.read_exact(2)
+                length = b1 & 0x7F
+                if length == 126:
+                    length, = struct.unpack('!H', self.read_exact(2))
+                elif length == 127:
+                    length, = struct.unpack('!Q', self.read_exact(8))
+                received += length
+                if not b1 & 0x80 or received > WS_MAX_MESSAGE:
+                    return None  # Clients must mask; oversized messages end the session
+                mask = self.read_exact(4)
+                payload = ws_unmask(self.read_exact(length), mask)
+                frame_opcode = b0 & 0x0F
+                if frame_opcode >= WS_CLOSE:
+                    received -= length
+                    if frame_opcode == WS_CLOSE:
+                        return None
+                    if frame_opcode == WS_PING:
+                        self.send(WS_PONG, payload)
+                    continue
+                if frame_opcode:
+                    opcode = frame_opcode
+                parts.append(payload)
+                if b0 & 0x80:
+                    return opcode, b''.join(parts)
+        except EOFError:
+            return None
+
+
+# Main page, encoded once at import time
+HTML_PAGE = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -518,6 +882,15 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             color: #888;
         }
 
+        .compress-toggle {
+            display: flex;
+            align-items: center;
+            gap: 6px;
+            margin-top: 10px;
+            font-size: 12px;
+            color: #888;
+        }
+
         /* Pending files */
         .pending-files {
             width: 100%;
@@ -557,6 +930,18 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             color: #888;
         }
 
+        .pending-file-progress {
+            display: block;
+            width: 100%;
+            height: 4px;
+            margin-top: 4px;
+            accent-color: #2563eb;
+        }
+
+        .pending-file-progress[hidden] {
+            display: none;
+        }
+
         .pending-file-remove {
             width: 28px;
             height: 28px;
@@ -603,21 +988,32 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             background: white;
             border-radius: 16px;
             box-shadow: 0 4px 20px rgba(0,0,0,0.06);
-            overflow: hidden;
+            overflow-y: auto;
+            max-height: 60vh;
+        }
+
+        /* Virtualized: full-height spacer, rows positioned inside it */
+        .mac-files-window {
+            position: relative;
         }
 
         .file-item {
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            height: 64px;
             display: flex;
             align-items: center;
             gap: 12px;
-            padding: 14px 16px;
+            padding: 0 16px;
             border-bottom: 1px solid #f0f0f0;
             cursor: pointer;
             transition: background 0.15s;
         }
 
-        .file-item:last-child {
-            border-bottom: none;
+        .file-item[hidden] {
+            display: none;
         }
 
         .file-item:active {
@@ -1044,6 +1440,8 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
 
         .crop-box {
             position: absolute;
+            left: 0;
+            top: 0;
             border: 2px solid #fff;
             box-shadow: 0 0 0 9999px rgba(0,0,0,0.5);
             cursor: move;
@@ -1087,6 +1485,7 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
                 <div class="upload-area">
                     <button class="upload-btn" id="uploadBtn" aria-label="Choose files"></button>
                     <div class="upload-hint">Tap to choose files</div>
+                    <label class="compress-toggle"><input type="checkbox" id="compressPhotos"> Shrink photos before sending</label>
                     
                     <div class="pending-files" id="pendingFiles"></div>
                     <button class="send-all-btn" id="sendBtn" style="display: none;">Send</button>
@@ -1097,7 +1496,8 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             <div class="section" id="downloadSection">
                 <div class="section-title" id="downloadSectionTitle">Download from PC</div>
                 <div class="mac-files" id="macFiles">
-                    <div class="empty-state">Loading...</div>
+                    <div class="mac-files-window" id="macFilesWindow"></div>
+                    <div class="empty-state" id="macFilesEmpty">Loading...</div>
                 </div>
             </div>
         </div>
@@ -1171,19 +1571,54 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         </div>
     </div>
 
+    <!-- Row templates, cloned by renderPendingFiles / renderMacFiles -->
+    <template id="pendingRowTpl">
+        <div class="pending-file">
+            <span class="pending-file-icon"></span>
+            <div class="pending-file-info">
+                <div class="pending-file-name"></div>
+                <div class="pending-file-size"></div>
+                <progress class="pending-file-progress" max="1" value="0" hidden></progress>
+            </div>
+            <button class="pending-file-remove">×</button>
+        </div>
+    </template>
+    <template id="fileRowTpl">
+        <div class="file-item">
+            <span class="file-icon"></span>
+            <div class="file-info">
+                <div class="file-name"></div>
+                <div class="file-meta"></div>
+            </div>
+            <span class="file-download">↓</span>
+        </div>
+    </template>
+
     <script>
         const fileInput = document.getElementById('fileInput');
         const uploadBtn = document.getElementById('uploadBtn');
         const pendingFilesEl = document.getElementById('pendingFiles');
         const sendBtn = document.getElementById('sendBtn');
         const macFilesEl = document.getElementById('macFiles');
+        const macFilesWindow = document.getElementById('macFilesWindow');
+        const macFilesEmpty = document.getElementById('macFilesEmpty');
+        const pendingRowTpl = document.getElementById('pendingRowTpl').content.firstElementChild;
+        const fileRowTpl = document.getElementById('fileRowTpl').content.firstElementChild;
 
         const statusEl = document.getElementById('status');
 
+        const UPLOAD_CONCURRENCY = 4;
+        const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+        const UPLOAD_RETRIES = 5;
+
         let pendingFiles = [];
+        const pendingKeys = new Set();  // pendingKey() of every pending file
+        const pendingKey = (file) => file.name + '|' + file.size;
 
-        // Desktop detection - if true, hide downloads section
-        const isDesktop = !(/Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini|Mobile|mobile/i.test(navigator.userAgent));
+        // Device detection - desktop hides the downloads section
+        const MOBILE_RE = /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini|Mobile/i;
+        const isMobile = MOBILE_RE.test(navigator.userAgent);
+        const isDesktop = !isMobile;
         
 
 
@@ -1231,71 +1666,197 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             }
         }
 
+        // Extension -> icon, built once at load (a Map, so names like
+        // "constructor" can't hit Object.prototype)
+        const EXT_ICONS = new Map([
+            ['🖼️', ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'bmp']],
+            ['🎬', ['mp4', 'mov', 'avi', 'mkv', 'webm']],
+            ['🎵', ['mp3', 'wav', 'flac', 'aac', 'm4a']],
+            ['📄', ['pdf']],
+            ['📝', ['doc', 'docx', 'txt', 'rtf', 'md']],
+            ['📦', ['zip', 'rar', '7z', 'tar', 'gz']]
+        ].flatMap(([icon, exts]) => exts.map(ext => [ext, icon])));
+
         function getFileIcon(filename) {
-            const ext = filename.toLowerCase().split('.').pop();
-            const icons = {
-                image: ['jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'bmp'],
-                video: ['mp4', 'mov', 'avi', 'mkv', 'webm'],
-                audio: ['mp3', 'wav', 'flac', 'aac', 'm4a'],
-                pdf: ['pdf'],
-                doc: ['doc', 'docx', 'txt', 'rtf', 'md'],
-                archive: ['zip', 'rar', '7z', 'tar', 'gz']
-            };
-            
-            for (const [type, exts] of Object.entries(icons)) {
-                if (exts.includes(ext)) {
-                    return { image: '🖼️', video: '🎬', audio: '🎵', pdf: '📄', doc: '📝', archive: '📦' }[type];
-                }
-            }
-            return '📁';
+            return EXT_ICONS.get(filename.slice(filename.lastIndexOf('.') + 1).toLowerCase()) || '📁';
         }
 
         // Upload handling
         uploadBtn.onclick = () => fileInput.click();
 
         fileInput.onchange = (e) => {
-            const files = Array.from(e.target.files);
-            files.forEach(file => {
-                if (!pendingFiles.some(f => f.name === file.name && f.size === file.size)) {
+            for (const file of e.target.files) {
+                const key = pendingKey(file);
+                if (!pendingKeys.has(key)) {
+                    pendingKeys.add(key);
                     pendingFiles.push(file);
                 }
-            });
+            }
             renderPendingFiles();
             fileInput.value = '';
         };
 
+        // Keyed list rendering: rows are reused by key and only moved, added or
+        // removed as needed, so an unchanged row is never rebuilt
+        function syncRows(container, rowCache, items, keyOf, buildRow) {
+            const keys = new Set();
+            let prev = null;
+            for (const item of items) {
+                const key = keyOf(item);
+                keys.add(key);
+                let row = rowCache.get(key);
+                if (!row) {
+                    row = buildRow(item);
+                    row.dataset.key = key;
+                    rowCache.set(key, row);
+                }
+                const expected = prev ? prev.nextSibling : container.firstChild;
+                if (row !== expected) container.insertBefore(row, expected);
+                prev = row;
+            }
+            // Everything after the last kept row is stale (old rows, empty-state text)
+            let extra = prev ? prev.nextSibling : container.firstChild;
+            while (extra) {
+                const next = extra.nextSibling;
+                extra.remove();
+                extra = next;
+            }
+            for (const key of rowCache.keys()) {
+                if (!keys.has(key)) rowCache.delete(key);
+            }
+        }
+
+        const pendingRows = new Map();
+
+        function buildPendingRow(file) {
+            const row = pendingRowTpl.cloneNode(true);
+            row.querySelector('.pending-file-icon').textContent = getFileIcon(file.name);
+            row.querySelector('.pending-file-name').textContent = file.name;
+            row.querySelector('.pending-file-size').textContent = formatSize(file.size);
+            return row;
+        }
+
         function renderPendingFiles() {
+            syncRows(pendingFilesEl, pendingRows, pendingFiles, pendingKey, buildPendingRow);
             if (pendingFiles.length === 0) {
-                pendingFilesEl.innerHTML = '';
                 sendBtn.style.display = 'none';
                 return;
             }
 
-            pendingFilesEl.innerHTML = pendingFiles.map((file, i) => `
-                <div class="pending-file">
-                    <span class="pending-file-icon">${getFileIcon(file.name)}</span>
-                    <div class="pending-file-info">
-                        <div class="pending-file-name">${file.name}</div>
-                        <div class="pending-file-size">${formatSize(file.size)}</div>
-                    </div>
-                    <button class="pending-file-remove" data-index="${i}">×</button>
-                </div>
-            `).join('');
-
             sendBtn.style.display = 'block';
-            const target = !isDesktop ? 'PC' : 'Phone';
+            const target = isMobile ? 'PC' : 'Phone';
             sendBtn.textContent = `Send ${pendingFiles.length} file${pendingFiles.length > 1 ? 's' : ''} to ${target}`;
+        }
 
-            // Add remove handlers
-            pendingFilesEl.querySelectorAll('.pending-file-remove').forEach(btn => {
-                btn.onclick = (e) => {
-                    const idx = parseInt(e.target.dataset.index);
-                    pendingFiles.splice(idx, 1);
-                    renderPendingFiles();
-                };
+        // Remove handler (delegated, so rows need no listeners of their own)
+        pendingFilesEl.onclick = (e) => {
+            const btn = e.target.closest('.pending-file-remove');
+            if (!btn) return;
+            const key = btn.closest('.pending-file').dataset.key;
+            pendingKeys.delete(key);
+            pendingFiles = pendingFiles.filter(file => pendingKey(file) !== key);
+            renderPendingFiles();
+        };
+
+        // Opt-in: re-encode large photos as JPEG before upload. Off by default
+        // since it's lossy; GIF/SVG are never touched.
+        const compressPhotos = document.getElementById('compressPhotos');
+        const RECOMPRESS_MIN_SIZE = 500 * 1000;
+        const RECOMPRESS_TYPES = new Set(['image/jpeg', 'image/png', 'image/webp', 'image/bmp']);
+
+        compressPhotos.checked = localStorage.getItem('compressPhotos') === '1';
+        compressPhotos.onchange = () => localStorage.setItem('compressPhotos', compressPhotos.checked ? '1' : '0');
+
+        async function shrinkPhoto(file) {
+            if (!compressPhotos.checked || !RECOMPRESS_TYPES.has(file.type) || file.size <= RECOMPRESS_MIN_SIZE) {
+                return file;
+            }
+            try {
+                const blob = await processPhoto(file, null, 0);
+                if (blob.size >= file.size) return file;
+                const dot = file.name.lastIndexOf('.');
+                const base = dot > 0 ? file.name.slice(0, dot) : file.name;
+                return new File([blob], base + '.jpg', { type: PHOTO_TYPE });
+            } catch (e) {
+                return file;  // Undecodable here; send the original
+            }
+        }
+
+        const delay = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+        // Bytes the server already holds for a chunked upload
+        async function uploadOffset(name, uploadId) {
+            const res = await fetch(`/upload/${encodeURIComponent(name)}?id=${uploadId}`, { method: 'HEAD' });
+            return res.ok ? Number(res.headers.get('X-Offset')) || 0 : 0;
+        }
+
+        // XHR rather than fetch, since it reports upload progress. Resolves
+        // with the HTTP status, rejects on network failure.
+        function postBlob(body, headers, onProgress) {
+            return new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+                xhr.open('POST', location.href);
+                for (const [name, value] of Object.entries(headers)) {
+                    xhr.setRequestHeader(name, value);
+                }
+                xhr.upload.onprogress = (e) => onProgress(e.loaded);
+                xhr.onload = () => resolve(xhr.status);
+                xhr.onerror = () => reject(new Error('Upload failed'));
+                xhr.send(body);
             });
         }
 
+        // Upload one file; large files go up as Content-Range chunks. Progress
+        // is shown on the file's pending row.
+        async function sendFile(file) {
+            const row = pendingRows.get(pendingKey(file));
+            const progress = row && row.querySelector('.pending-file-progress');
+            const body = await shrinkPhoto(file);
+            const showProgress = (sent) => {
+                if (progress) progress.value = body.size ? sent / body.size : 1;
+            };
+            if (progress) progress.hidden = false;
+            showProgress(0);
+
+            const headers = {
+                'Content-Type': body.type || 'application/octet-stream',
+                'X-Filename': encodeURIComponent(body.name)
+            };
+
+            // Failed requests are retried with exponential backoff; chunked
+            // uploads first ask the server where to resume
+            const chunked = body.size > UPLOAD_CHUNK_SIZE;
+            const uploadId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+            let start = 0;
+            let failures = 0;
+            do {
+                const end = chunked ? Math.min(start + UPLOAD_CHUNK_SIZE, body.size) : body.size;
+                const requestHeaders = chunked ? {
+                    ...headers,
+                    'X-Upload-Id': uploadId,
+                    'Content-Range': `bytes ${start}-${end - 1}/${body.size}`
+                } : headers;
+                let status = 0;
+                try {
+                    status = await postBlob(chunked ? body.slice(start, end) : body, requestHeaders,
+                                            (sent) => showProgress(start + sent));
+                } catch (e) {
+                    // Network error: retry below
+                }
+                if (status >= 200 && status < 300) {
+                    start = end;
+                    failures = 0;
+                    continue;
+                }
+                // A whole-file upload the server rejected won't do better next time
+                if (!chunked && status >= 400 && status < 500) return false;
+                if (++failures > UPLOAD_RETRIES) return false;
+                await delay(250 * 2 ** failures);
+                if (chunked) start = await uploadOffset(body.name, uploadId).catch(() => start);
+            } while (start < body.size);
+            return true;
+        }
+
         sendBtn.onclick = async () => {
             if (pendingFiles.length === 0) return;
 
@@ -1305,26 +1866,23 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             let successCount = 0;
             let failCount = 0;
 
-            for (const file of pendingFiles) {
-                try {
-                    const res = await fetch(location.href, {
-                        method: 'POST',
-                        body: file,
-                        headers: {
-                            'Content-Type': file.type || 'application/octet-stream',
-                            'X-Filename': encodeURIComponent(file.name)
+            // Upload with a small pool of workers so short files don't wait on each other
+            const queue = [...pendingFiles];
+            const worker = async () => {
+                while (queue.length) {
+                    const file = queue.shift();
+                    try {
+                        if (await sendFile(file)) {
+                            successCount++;
+                        } else {
+                            failCount++;
                         }
-                    });
-
-                    if (res.ok) {
-                        successCount++;
-                    } else {
+                    } catch (e) {
                         failCount++;
                     }
-                } catch (e) {
-                    failCount++;
                 }
-            }
+            };
+            await Promise.all(Array.from({ length: UPLOAD_CONCURRENCY }, worker));
 
             if (successCount > 0) {
                 sendBtn.classList.add('success');
@@ -1333,6 +1891,7 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
                 
                 setTimeout(() => {
                     pendingFiles = [];
+                    pendingKeys.clear();
                     renderPendingFiles();
                     sendBtn.classList.remove('success');
                     loadMacFiles();
@@ -1347,52 +1906,95 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         };
 
         // PC files listing
-        async function loadMacFiles() {
-            try {
-                const res = await fetch('/files');
-                const files = await res.json();
+        // The Downloads list is virtualized: only rows in view (plus a margin)
+        // exist. They come from a pool; list index i always uses slot
+        // i % pool size, so scrolling by a row re-fills just one of them.
+        const FILE_ROW_HEIGHT = 64;
+        const FILE_ROW_OVERSCAN = 4;
+        const fileRowPool = [];
+        let macFiles = [];
+        let macFilesFrame = 0;
+
+        function renderMacFiles() {
+            macFilesFrame = 0;
+            const visible = Math.ceil(macFilesEl.clientHeight / FILE_ROW_HEIGHT) + FILE_ROW_OVERSCAN;
+            while (fileRowPool.length < visible) {
+                const row = fileRowTpl.cloneNode(true);
+                row.hidden = true;
+                macFilesWindow.appendChild(row);
+                fileRowPool.push(row);
+            }
 
-                if (files.length === 0) {
-                    macFilesEl.innerHTML = '<div class="empty-state">No files in Downloads folder</div>';
-                    return;
+            const poolSize = fileRowPool.length;
+            const start = Math.min(Math.floor(macFilesEl.scrollTop / FILE_ROW_HEIGHT), macFiles.length);
+            const end = Math.min(start + poolSize, macFiles.length);
+            for (let slot = 0; slot < poolSize; slot++) {
+                const row = fileRowPool[slot];
+                const index = start + (slot - start % poolSize + poolSize) % poolSize;
+                if (index >= end) {
+                    row.hidden = true;
+                    continue;
                 }
+                const file = macFiles[index];
+                const key = file.name + '|' + file.size + '|' + file.modified;
+                if (row.dataset.key !== key) {
+                    row.dataset.key = key;
+                    row.dataset.href = file.href;
+                    row.dataset.filename = file.name;
+                    row.querySelector('.file-icon').textContent = file.icon;
+                    row.querySelector('.file-name').textContent = file.name;
+                    row.querySelector('.file-meta').textContent = formatSize(file.size);
+                }
+                row.style.transform = `translateY(${index * FILE_ROW_HEIGHT}px)`;
+                row.hidden = false;
+            }
+        }
 
-                macFilesEl.innerHTML = files.slice(0, 50).map(file => `
-                    <div class="file-item" data-filename="${encodeURIComponent(file.name)}">
-                        <span class="file-icon">${file.icon}</span>
-                        <div class="file-info">
-                            <div class="file-name">${file.name}</div>
-                            <div class="file-meta">${file.size_formatted}</div>
-                        </div>
-                        <span class="file-download">↓</span>
-                    </div>
-                `).join('');
-
-                // Add download handlers
-                macFilesEl.querySelectorAll('.file-item').forEach(item => {
-                    item.onclick = (e) => {
-                        e.preventDefault();
-                        e.stopPropagation();
-                        const filename = decodeURIComponent(item.dataset.filename);
-                        downloadFile(filename);
-                        return false;
-                    };
-                });
+        function scheduleMacFilesRender() {
+            if (!macFilesFrame) macFilesFrame = requestAnimationFrame(renderMacFiles);
+        }
+
+        macFilesEl.addEventListener('scroll', scheduleMacFilesRender, { passive: true });
+        // Also covers the list becoming visible when switching tabs
+        new ResizeObserver(scheduleMacFilesRender).observe(macFilesEl);
+
+        function showMacFiles(files, emptyText) {
+            macFiles = files;
+            macFilesWindow.style.height = files.length * FILE_ROW_HEIGHT + 'px';
+            macFilesEmpty.textContent = emptyText;
+            macFilesEmpty.hidden = files.length > 0;
+            renderMacFiles();
+        }
 
+        async function loadMacFiles() {
+            // Desktop hides the Downloads section, so don't fetch and render it there
+            if (isDesktop) return;
+            try {
+                const res = await fetch('/files');
+                showMacFiles(await res.json(), 'No files in Downloads folder');
             } catch (e) {
-                macFilesEl.innerHTML = '<div class="empty-state">Could not load files</div>';
+                showMacFiles([], 'Could not load files');
             }
         }
 
+        // Download handler (delegated, one listener for all rows)
+        macFilesEl.onclick = (e) => {
+            const item = e.target.closest('.file-item');
+            if (!item) return;
+            e.preventDefault();
+            e.stopPropagation();
+            downloadFile(item.dataset.href, item.dataset.filename);
+        };
+
         let isDownloading = false;
-        function downloadFile(filename) {
+        function downloadFile(href, filename) {
             // Prevent duplicate downloads
             if (isDownloading) return;
             isDownloading = true;
             
             // Direct download - the server handles Unicode filenames properly
             const link = document.createElement('a');
-            link.href = `/download/${encodeURIComponent(filename)}`;
+            link.href = href;
             link.download = filename;
             link.style.display = 'none';
             document.body.appendChild(link);
@@ -1408,9 +2010,186 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         const charCount = document.getElementById('charCount');
         const syncTextBtn = document.getElementById('syncTextBtn');
 
-        // Update character count
+        // ========== SYNC CHANNEL ==========
+        // One WebSocket carries text both ways and clipboard photos up.
+        // Messages stay in `unacked` until the server confirms them and are
+        // resent after a reconnect; without a socket we fall back to plain POSTs.
+        const unacked = new Map();
+        let syncSocket = null;
+        let syncRetryDelay = 500;
+        let nextMessageId = 1;
+        // Last text confirmed by the server, so edits can go up as diffs
+        let serverText = '';
+        let serverVersion = null;  // null until known; forces a full send
+
+        function connectSync() {
+            const ws = new WebSocket((location.protocol === 'https:' ? 'wss' : 'ws') + '://' + location.host + '/sync');
+            ws.onopen = () => {
+                syncSocket = ws;
+                syncRetryDelay = 500;
+                serverVersion = null;  // The server may have restarted
+                for (const entry of unacked.values()) transmit(entry);
+            };
+            ws.onmessage = (e) => {
+                const msg = JSON.parse(e.data);
+                if (msg.type === 'ack') {
+                    const entry = unacked.get(msg.id);
+                    if (entry) {
+                        unacked.delete(msg.id);
+                        entry.resolve(msg);
+                    }
+                } else if (msg.type === 'text' && !hasUnackedText() && !textPending) {
+                    // Local edits in flight or still waiting to be sent win
+                    // Pushes from different peers can arrive out of order
+                    if (serverVersion !== null && msg.version <= serverVersion) return;
+                    serverText = msg.value;
+                    serverVersion = msg.version;
+                    if (msg.value !== syncTextarea.value) {
+                        syncTextarea.value = msg.value;
+                        lastLength = msg.value.length;
+                        charCount.textContent = lastLength;
+                    }
+                }
+            };
+            ws.onclose = () => {
+                syncSocket = null;
+                setTimeout(connectSync, syncRetryDelay);
+                syncRetryDelay = Math.min(syncRetryDelay * 2, 30000);
+            };
+        }
+
+        function transmit(entry) {
+            if (!syncSocket) return;
+            syncSocket.send(JSON.stringify(entry.msg));
+            if (entry.data) syncSocket.send(entry.data);
+        }
+
+        function sendSync(msg, data) {
+            msg.id = nextMessageId++;
+            return new Promise((resolve) => {
+                const entry = { msg, data, resolve };
+                unacked.set(msg.id, entry);
+                transmit(entry);
+            });
+        }
+
+        const isTextMessage = (msg) => msg.type === 'text' || msg.type === 'textdiff';
+
+        function hasUnackedText() {
+            for (const entry of unacked.values()) {
+                if (isTextMessage(entry.msg)) return true;
+            }
+            return false;
+        }
+
+        // Common prefix/suffix diff in UTF-16 code units (what the server
+        // expects), widened so it never splits a surrogate pair
+        function textDiff(a, b) {
+            const max = Math.min(a.length, b.length);
+            let start = 0;
+            while (start < max && a.charCodeAt(start) === b.charCodeAt(start)) start++;
+            if (start > 0 && (a.charCodeAt(start - 1) & 0xFC00) === 0xD800) start--;
+            let endA = a.length;
+            let endB = b.length;
+            while (endA > start && endB > start && a.charCodeAt(endA - 1) === b.charCodeAt(endB - 1)) {
+                endA--;
+                endB--;
+            }
+            if (endA < a.length && (a.charCodeAt(endA) & 0xFC00) === 0xDC00) {
+                endA++;
+                endB++;
+            }
+            return { at: start, remove: endA - start, insert: b.slice(start, endB) };
+        }
+
+        async function sendText(value) {
+            if (!syncSocket) {
+                const res = await fetch('/text', {
+                    method: 'POST',
+                    body: value,
+                    headers: { 'Content-Type': 'text/plain' }
+                });
+                return { success: res.ok };
+            }
+            // Diff against the confirmed text when nothing else is in flight;
+            // otherwise the base is uncertain, so send it all
+            const msg = serverVersion !== null && !hasUnackedText()
+                ? { type: 'textdiff', base: serverVersion, ...textDiff(serverText, value) }
+                : { type: 'text', value };
+            // Only the latest text matters; settle older unconfirmed edits
+            for (const [id, entry] of unacked) {
+                if (isTextMessage(entry.msg)) {
+                    unacked.delete(id);
+                    entry.resolve({ success: true });
+                }
+            }
+            const ack = await sendSync(msg);
+            if (ack.version != null) {
+                serverText = value;
+                serverVersion = ack.version;
+            } else if (msg.type === 'textdiff' && !ack.success) {
+                // The server's text moved on since our base; resend in full
+                serverVersion = null;
+                return sendText(value);
+            }
+            return ack;
+        }
+
+        async function sendClipboard(blob) {
+            if (!syncSocket) {
+                const res = await fetch('/clipboard', {
+                    method: 'POST',
+                    body: blob,
+                    headers: { 'Content-Type': blob.type || 'application/octet-stream' }
+                });
+                return { success: res.ok };
+            }
+            return sendSync({ type: 'clipboard' }, await blob.arrayBuffer());
+        }
+
+        // Keep the idle socket inside the server's keep-alive timeout
+        setInterval(() => {
+            if (syncSocket) syncSocket.send('{"type":"ping"}');
+        }, 25000);
+
+        // Update character count and push edits once typing pauses. Sends wait
+        // for a 150 ms pause, then for an idle moment so they never compete
+        // with keystrokes (Safari lacks requestIdleCallback).
+        const whenIdle = window.requestIdleCallback
+            ? (cb) => requestIdleCallback(cb, { timeout: 300 })
+            : (cb) => setTimeout(cb, 0);
+        const cancelIdle = window.cancelIdleCallback
+            ? (handle) => cancelIdleCallback(handle)
+            : (handle) => clearTimeout(handle);
+        let textDebounce = 0;
+        let textIdle = 0;
+        let textPending = false;  // Edits waiting on the debounce or idle callback
+        let lastLength = 0;
+
+        function cancelTextSync() {
+            clearTimeout(textDebounce);
+            cancelIdle(textIdle);
+            textPending = false;
+        }
+
+        function scheduleTextSync() {
+            cancelTextSync();
+            textPending = true;
+            textDebounce = setTimeout(() => {
+                textIdle = whenIdle(() => {
+                    textPending = false;
+                    sendText(syncTextarea.value).catch(() => {});
+                });
+            }, 150);
+        }
+
         syncTextarea.addEventListener('input', () => {
-            charCount.textContent = syncTextarea.value.length;
+            const length = syncTextarea.value.length;
+            if (length !== lastLength) {
+                lastLength = length;
+                charCount.textContent = length;
+            }
+            scheduleTextSync();
         });
 
         // Sync text to server
@@ -1418,15 +2197,12 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             const originalText = syncTextBtn.innerHTML;
             syncTextBtn.disabled = true;
             syncTextBtn.innerHTML = '<span class="spinner"></span>Syncing...';
+            cancelTextSync();
 
             try {
-                const res = await fetch('/text', {
-                    method: 'POST',
-                    body: syncTextarea.value,
-                    headers: { 'Content-Type': 'text/plain' }
-                });
+                const res = await sendText(syncTextarea.value);
 
-                if (res.ok) {
+                if (res.success) {
                     syncTextBtn.classList.add('success');
                     syncTextBtn.textContent = '✓ Synced!';
                     showStatus('Text synced successfully', 'success');
@@ -1447,20 +2223,6 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             syncTextBtn.disabled = false;
         };
 
-        // Load synced text from server
-        async function loadSyncedText() {
-            try {
-                const res = await fetch('/text');
-                const data = await res.json();
-                if (data.text) {
-                    syncTextarea.value = data.text;
-                    charCount.textContent = data.text.length;
-                }
-            } catch (e) {
-                console.log('Could not load synced text');
-            }
-        }
-
         // ========== TAB NAVIGATION ==========
         const tabNav = document.getElementById('tabNav');
         const tabBtns = document.querySelectorAll('.tab-btn');
@@ -1501,6 +2263,7 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         const resizeHandle = document.getElementById('resizeHandle');
         
         let currentCameraFile = null;
+        let pendingCrop = null;  // Applied together with rotation when sending
         let rotation = 0;
         let previewUrl = null;
 
@@ -1517,9 +2280,11 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         function resetCameraUI() {
             cleanupCamera();
             currentCameraFile = null;
+            pendingCrop = null;
             rotation = 0;
             cameraPreview.style.display = 'none';
             cameraPreview.style.transform = 'rotate(0deg)';
+            cameraPreview.style.clipPath = '';
             cameraPreview.src = '';
             cameraPlaceholder.style.display = 'block';
             cameraControls.style.display = 'none';
@@ -1530,12 +2295,14 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             
             cleanupCamera();
             currentCameraFile = file;
+            pendingCrop = null;
             rotation = 0;
             
             previewUrl = URL.createObjectURL(file);
             cameraPreview.src = previewUrl;
             cameraPreview.style.display = 'block';
             cameraPreview.style.transform = 'rotate(0deg)';
+            cameraPreview.style.clipPath = '';
             cameraPlaceholder.style.display = 'none';
             cameraControls.style.display = 'flex';
             cameraStatus.textContent = '';
@@ -1556,10 +2323,10 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             cropImage.onload = () => {
                 const rect = cropImage.getBoundingClientRect();
                 const size = Math.min(rect.width, rect.height) * 0.8;
-                cropBox.style.width = size + 'px';
-                cropBox.style.height = size + 'px';
-                cropBox.style.left = ((rect.width - size) / 2) + 'px';
-                cropBox.style.top = ((rect.height - size) / 2) + 'px';
+                box.width = box.height = size;
+                box.left = (rect.width - size) / 2;
+                box.top = (rect.height - size) / 2;
+                placeCropBox();
             };
         };
 
@@ -1567,43 +2334,61 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             cropOverlay.style.display = 'none';
         };
 
-        cropApply.onclick = async () => {
+        cropApply.onclick = () => {
             const imgRect = cropImage.getBoundingClientRect();
             const boxRect = cropBox.getBoundingClientRect();
             
             const scaleX = cropImage.naturalWidth / imgRect.width;
             const scaleY = cropImage.naturalHeight / imgRect.height;
             
+            // Whole pixels keep the canvas draw free of sub-pixel resampling
             const cropData = {
-                x: (boxRect.left - imgRect.left) * scaleX,
-                y: (boxRect.top - imgRect.top) * scaleY,
-                width: boxRect.width * scaleX,
-                height: boxRect.height * scaleY
+                x: Math.floor((boxRect.left - imgRect.left) * scaleX),
+                y: Math.floor((boxRect.top - imgRect.top) * scaleY),
+                width: Math.floor(boxRect.width * scaleX),
+                height: Math.floor(boxRect.height * scaleY)
             };
             
-            currentCameraFile = await applyCrop(currentCameraFile, cropData);
-            
-            cleanupCamera();
-            previewUrl = URL.createObjectURL(currentCameraFile);
-            cameraPreview.src = previewUrl;
-            cameraPreview.style.transform = 'rotate(0deg)';
-            rotation = 0;
+            // Nothing is encoded yet; the preview just clips to the crop box
+            pendingCrop = cropData;
+            const { naturalWidth: w, naturalHeight: h } = cropImage;
+            const right = w - cropData.x - cropData.width;
+            const bottom = h - cropData.y - cropData.height;
+            cameraPreview.style.clipPath =
+                `inset(${cropData.y / h * 100}% ${right / w * 100}% ${bottom / h * 100}% ${cropData.x / w * 100}%)`;
             
             cropOverlay.style.display = 'none';
         };
 
-        // Crop box drag and resize
+        // Crop box drag and resize. Geometry lives in `box`; touch moves are
+        // coalesced so the DOM is written at most once per frame.
+        const box = { left: 0, top: 0, width: 0, height: 0 };
         let isDragging = false;
         let isResizing = false;
         let startX, startY, startLeft, startTop, startW, startH;
+        let pendingMove = null;
+        let cropFrame = 0;
+        let imgRect = null;  // Measured once per gesture, not per move
+
+        const forgetImgRect = () => { imgRect = null; };
+        window.addEventListener('resize', forgetImgRect);
+        window.addEventListener('orientationchange', forgetImgRect);
+
+        function placeCropBox() {
+            cropBox.style.width = box.width + 'px';
+            cropBox.style.height = box.height + 'px';
+            // transform rather than left/top, so moving the box needs no layout
+            cropBox.style.transform = `translate(${box.left}px, ${box.top}px)`;
+        }
 
         resizeHandle.addEventListener('touchstart', (e) => {
             isResizing = true;
             const touch = e.touches[0];
             startX = touch.clientX;
             startY = touch.clientY;
-            startW = cropBox.offsetWidth;
-            startH = cropBox.offsetHeight;
+            startW = box.width;
+            startH = box.height;
+            imgRect = cropImage.getBoundingClientRect();
             e.preventDefault();
             e.stopPropagation();
         });
@@ -1614,99 +2399,120 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             const touch = e.touches[0];
             startX = touch.clientX;
             startY = touch.clientY;
-            startLeft = cropBox.offsetLeft;
-            startTop = cropBox.offsetTop;
+            startLeft = box.left;
+            startTop = box.top;
+            imgRect = cropImage.getBoundingClientRect();
             e.preventDefault();
         });
 
+        function moveCropBox() {
+            cropFrame = 0;
+            const { dx, dy, resizing } = pendingMove;
+            if (!imgRect) imgRect = cropImage.getBoundingClientRect();
+            
+            if (resizing) {
+                box.width = Math.min(Math.max(50, startW + dx), imgRect.width - box.left);
+                box.height = Math.min(Math.max(50, startH + dy), imgRect.height - box.top);
+            } else {
+                box.left = Math.max(0, Math.min(imgRect.width - box.width, startLeft + dx));
+                box.top = Math.max(0, Math.min(imgRect.height - box.height, startTop + dy));
+            }
+            placeCropBox();
+        }
+
         document.addEventListener('touchmove', (e) => {
             if (!isDragging && !isResizing) return;
             const touch = e.touches[0];
-            const imgRect = cropImage.getBoundingClientRect();
-            
-            if (isResizing) {
-                const dx = touch.clientX - startX;
-                const dy = touch.clientY - startY;
-                let newW = Math.max(50, startW + dx);
-                let newH = Math.max(50, startH + dy);
-                newW = Math.min(newW, imgRect.width - cropBox.offsetLeft);
-                newH = Math.min(newH, imgRect.height - cropBox.offsetTop);
-                cropBox.style.width = newW + 'px';
-                cropBox.style.height = newH + 'px';
-            } else if (isDragging) {
-                const dx = touch.clientX - startX;
-                const dy = touch.clientY - startY;
-                const boxW = cropBox.offsetWidth;
-                const boxH = cropBox.offsetHeight;
-                let newLeft = Math.max(0, Math.min(imgRect.width - boxW, startLeft + dx));
-                let newTop = Math.max(0, Math.min(imgRect.height - boxH, startTop + dy));
-                cropBox.style.left = newLeft + 'px';
-                cropBox.style.top = newTop + 'px';
-            }
-        });
+            pendingMove = { dx: touch.clientX - startX, dy: touch.clientY - startY, resizing: isResizing };
+            if (!cropFrame) cropFrame = requestAnimationFrame(moveCropBox);
+        }, { passive: true });
 
         document.addEventListener('touchend', () => {
             isDragging = false;
             isResizing = false;
+            imgRect = null;
         });
 
-        async function applyCrop(file, crop) {
-            return new Promise((resolve) => {
-                const img = new Image();
-                const url = URL.createObjectURL(file);
-                img.onload = () => {
-                    const canvas = document.createElement('canvas');
-                    canvas.width = crop.width;
-                    canvas.height = crop.height;
-                    const ctx = canvas.getContext('2d');
-                    ctx.drawImage(img, crop.x, crop.y, crop.width, crop.height, 0, 0, crop.width, crop.height);
-                    canvas.toBlob((blob) => {
-                        URL.revokeObjectURL(url);
-                        resolve(blob);
-                    }, 'image/png');
-                };
-                img.src = url;
-            });
+        // Edited photos are re-encoded as JPEG: far smaller and cheaper to encode
+        // than PNG, and unlike WebP every desktop clipboard backend can read it
+        const PHOTO_TYPE = 'image/jpeg';
+        const PHOTO_QUALITY = 0.9;
+
+        const hasOffscreenCanvas = typeof OffscreenCanvas !== 'undefined';
+
+        function createCanvas(width, height) {
+            if (hasOffscreenCanvas) return new OffscreenCanvas(width, height);
+            const canvas = document.createElement('canvas');
+            canvas.width = width;
+            canvas.height = height;
+            return canvas;
         }
 
-        async function rotateImage(file, degrees) {
-            return new Promise((resolve, reject) => {
-                const img = new Image();
-                const url = URL.createObjectURL(file);
-                
-                img.onload = () => {
+        function canvasToBlob(canvas) {
+            if (hasOffscreenCanvas) {
+                return canvas.convertToBlob({ type: PHOTO_TYPE, quality: PHOTO_QUALITY });
+            }
+            return new Promise((resolve) => canvas.toBlob(resolve, PHOTO_TYPE, PHOTO_QUALITY));
+        }
+
+        // Crop while decoding, rotate while drawing: one decode and one encode
+        // per photo. createImageBitmap decodes without an <img> or object URL.
+        async function editPhoto(file, crop, rotation) {
+            // Honor EXIF orientation explicitly, as the <img> preview (and so the
+            // crop rectangle and the user's rotation) already does
+            const options = { imageOrientation: 'from-image' };
+            const bitmap = crop
+                ? await createImageBitmap(file, crop.x, crop.y, crop.width, crop.height, options)
+                : await createImageBitmap(file, options);
+            const { width, height } = bitmap;
+            const quarterTurn = rotation === 90 || rotation === 270;
+            const canvas = createCanvas(quarterTurn ? height : width, quarterTurn ? width : height);
+            // Opaque context: output is JPEG, so skip alpha compositing
+            const ctx = canvas.getContext('2d', { alpha: false });
+            ctx.imageSmoothingEnabled = false;  // Quarter turns map pixels 1:1
+            ctx.fillStyle = '#fff';  // Flatten transparent images onto white
+            ctx.fillRect(0, 0, canvas.width, canvas.height);
+            ctx.translate(canvas.width / 2, canvas.height / 2);
+            ctx.rotate(rotation * Math.PI / 180);
+            ctx.drawImage(bitmap, -width / 2, -height / 2);
+            bitmap.close();
+            return canvasToBlob(canvas);
+        }
+
+        // Photo edits run in a worker so decode and JPEG encode never block touch
+        // input. The worker is built from the source of the functions above.
+        const photoJobs = new Map();
+        let nextPhotoJob = 1;
+        let photoWorker = null;
+        if (hasOffscreenCanvas && window.Worker) {
+            const source = [
+                `const PHOTO_TYPE = '${PHOTO_TYPE}', PHOTO_QUALITY = ${PHOTO_QUALITY}, hasOffscreenCanvas = true`,
+                createCanvas, canvasToBlob, editPhoto,
+                `onmessage = async (e) => {
+                    const { id, file, crop, rotation } = e.data;
                     try {
-                        const canvas = document.createElement('canvas');
-                        const ctx = canvas.getContext('2d');
-                        
-                        if (degrees === 90 || degrees === 270) {
-                            canvas.width = img.height;
-                            canvas.height = img.width;
-                        } else {
-                            canvas.width = img.width;
-                            canvas.height = img.height;
-                        }
-                        
-                        ctx.translate(canvas.width / 2, canvas.height / 2);
-                        ctx.rotate(degrees * Math.PI / 180);
-                        ctx.drawImage(img, -img.width / 2, -img.height / 2);
-                        
-                        canvas.toBlob((blob) => {
-                            URL.revokeObjectURL(url);
-                            resolve(blob);
-                        }, 'image/png');
-                    } catch (e) {
-                        URL.revokeObjectURL(url);
-                        reject(e);
+                        postMessage({ id, blob: await editPhoto(file, crop, rotation) });
+                    } catch (err) {
+                        postMessage({ id, error: String(err) });
                     }
-                };
-                
-                img.onerror = () => {
-                    URL.revokeObjectURL(url);
-                    reject(new Error('Failed to load image'));
-                };
-                
-                img.src = url;
+                }`
+            ].join(';');
+            photoWorker = new Worker(URL.createObjectURL(new Blob([source], { type: 'text/javascript' })));
+            photoWorker.onmessage = (e) => {
+                const { id, blob, error } = e.data;
+                const job = photoJobs.get(id);
+                photoJobs.delete(id);
+                if (error) job.reject(new Error(error));
+                else job.resolve(blob);
+            };
+        }
+
+        function processPhoto(file, crop, rotation) {
+            if (!photoWorker) return editPhoto(file, crop, rotation);
+            return new Promise((resolve, reject) => {
+                const id = nextPhotoJob++;
+                photoJobs.set(id, { resolve, reject });
+                photoWorker.postMessage({ id, file, crop, rotation });
             });
         }
 
@@ -1720,17 +2526,13 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
             try {
                 let blob = currentCameraFile;
                 
-                if (rotation !== 0) {
-                    blob = await rotateImage(currentCameraFile, rotation);
+                if (pendingCrop || rotation !== 0) {
+                    blob = await processPhoto(currentCameraFile, pendingCrop, rotation);
                 }
                 
-                const res = await fetch('/clipboard', {
-                    method: 'POST',
-                    body: blob,
-                    headers: { 'Content-Type': 'image/png' }
-                });
+                const res = await sendClipboard(blob);
                 
-                if (res.ok) {
+                if (res.success) {
                     cameraStatus.textContent = '✓ Copied to clipboard!';
                     cameraStatus.className = 'success';
                     shutterBtn.classList.add('flash');
@@ -1757,10 +2559,10 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
         function initApp() {
             updateUIForDevice();
             loadMacFiles();
-            loadSyncedText();
+            connectSync();
             
             // Show tabs on mobile only
-            if (!isDesktop) {
+            if (isMobile) {
                 tabNav.style.display = 'flex';
             }
         }
@@ -1770,26 +2572,685 @@ class FileTransferHandler(http.server.BaseHTTPRequestHandler):
     </script>
 </body>
 </html>'''
-        self.wfile.write(html.encode('utf-8'))
+HTML_BYTES = HTML_PAGE.encode('utf-8')
+HTML_ETAG = f'"{hashlib.sha1(HTML_BYTES).hexdigest()[:16]}"'
+HTML_GZIP = gzip.compress(HTML_BYTES, compresslevel=9)
+HTML_GZIP_ETAG = HTML_ETAG[:-1] + '-gzip"'
+
+
+class FileTransferHandler(http.server.BaseHTTPRequestHandler):
+    # Keep connections open between requests; every response sets Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Buffer headers and body together so a response is a single send(); the
+    # default 8 KiB would split off the gzipped page and /files bodies
+    wbufsize = RESPONSE_BUFFER_SIZE
+    # Drop idle keep-alive connections
+    timeout = IDLE_TIMEOUT
+    holds_worker_slot = False
+
+    def parse_request(self):
+        # Take a worker slot once a request has arrived, so idle keep-alive
+        # connections don't hold one while they wait for the next request
+        if not super().parse_request():
+            return False
+        if not self.server.worker_slots.acquire(timeout=WORKER_WAIT_TIMEOUT):
+            self.send_error(503, "Server busy")
+            return False
+        self.holds_worker_slot = True
+        return True
+
+    def release_worker_slot(self):
+        if self.holds_worker_slot:
+            self.holds_worker_slot = False
+            self.server.worker_slots.release()
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        finally:
+            self.release_worker_slot()
+
+    def do_POST(self):
+        """Handle file upload and text sync."""
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        
+        # Handle text sync
+        if path == '/text':
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                if content_length > 0:
+                    text_data = self.rfile.read(content_length).decode('utf-8')
+                    set_synced_text(text_data)
+                    log.info("📝 Text synced: %d characters", len(text_data))
+                    length = len(text_data)
+                else:
+                    with synced_text_lock:
+                        length = len(synced_text)
+                
+                self.send_json({'success': True, 'length': length})
+            except Exception as e:
+                log.error("❌ Text sync error: %s", e)
+                self.send_error(500, str(e))
+            return
+        
+        # Handle clipboard image (camera paster feature)
+        if path == '/clipboard':
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                
+                if content_length == 0:
+                    self.send_error(400, "No image data received")
+                    return
+                
+                if copy_image_native is not None:
+                    # Native API takes the bytes directly, no temp file
+                    image = io.BytesIO()
+                    received = self.copy_body_to(image, content_length)
+                    if received < content_length:
+                        self.send_error(400, "Image upload incomplete")
+                        return
+                    success, error = copy_image_data_to_clipboard(image.getvalue())
+                else:
+                    # Stream the image data to a temp file for the helper process
+                    with tempfile.NamedTemporaryFile(prefix='clipboard_photo_', suffix='.png',
+                                                     delete=False) as f:
+                        received = self.copy_body_to(f, content_length)
+                    try:
+                        if received < content_length:
+                            self.send_error(400, "Image upload incomplete")
+                            return
+                        # Copy to clipboard (cross-platform)
+                        success, error = copy_image_to_clipboard(f.name)
+                    finally:
+                        os.unlink(f.name)
+                
+                if success:
+                    log.info("✅ Photo copied to clipboard! (%d bytes)", received)
+                    body = b"Photo copied to clipboard!"
+                    self.send_response(200)
+                    self.send_header('Content-type', 'text/plain')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    log.error("❌ Clipboard error: %s", error)
+                    self.send_error(500, f"Clipboard error: {error}")
+                    
+            except Exception as e:
+                log.error("❌ Clipboard error: %s", e)
+                self.send_error(500, str(e))
+            return
+        
+        try:
+            content_type = self.headers.get('Content-Type', '')
+            content_length = int(self.headers.get('Content-Length', 0))
+            
+            if content_length == 0:
+                self.send_error(400, "No file data received")
+                return
+            
+            # Get filename from header or generate one
+            filename = self.headers.get('X-Filename', '')
+            if filename:
+                filename = urllib.parse.unquote(filename)
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"phone_file_{timestamp}"
+            
+            # Sanitize filename
+            filename = os.path.basename(filename)
+            
+            # Save to Downloads folder (atomically replaces an existing file)
+            file_path = os.path.join(DOWNLOADS_FOLDER, filename)
+            
+            # Large files arrive as a series of Content-Range chunks
+            content_range = self.headers.get('Content-Range')
+            if content_range:
+                self.receive_chunk(filename, file_path, content_range, content_length)
+                return
+            
+            # Stream request body straight to disk so memory stays bounded
+            received = self.stream_to_file(file_path, content_length)
+            if received < content_length:
+                log.error("❌ Upload incomplete: %s (%d/%d bytes)", filename, received, content_length)
+                self.send_error(400, "Upload incomplete")
+                return
+            
+            invalidate_files_cache()
+            saved_name = os.path.basename(file_path)
+            log.info("✅ File saved: %s (%s)", saved_name, format_file_size(received))
+            
+            self.send_json({
+                'success': True,
+                'filename': saved_name,
+                'size': received
+            })
+            
+        except Exception as e:
+            log.error("❌ Upload error: %s", e)
+            self.send_error(500, str(e))
+    
+    def receive_chunk(self, filename, file_path, content_range, content_length):
+        """Write one 'bytes a-b/total' chunk of an upload; the last chunk completes the file.
+
+        Chunks of one upload share a hidden temp file keyed by X-Upload-Id and
+        must arrive in order, so the final chunk implies all earlier ones landed.
+        A chunk may repeat data already received (a retry), but not skip ahead.
+        """
+        match = CONTENT_RANGE_RE.match(content_range)
+        upload_id = self.headers.get('X-Upload-Id', '')
+        if not match or not UPLOAD_ID_RE.match(upload_id):
+            self.send_error(400, "Invalid chunk headers")
+            return
+        start, end, total = map(int, match.groups())
+        if end < start or end >= total or end - start + 1 != content_length:
+            self.send_error(400, "Chunk range does not match body")
+            return
+        
+        temp_path = chunk_temp_path(filename, upload_id)
+        with upload_offsets_lock:
+            offset = upload_offsets.get(temp_path, (0, 0))[0]
+            finished = temp_path in completed_uploads
+        if finished:
+            # Saving it again would create a duplicate; HEAD reports it as done
+            self.send_error(409, "Upload already complete")
+            return
+        if start > offset:
+            # A gap would leave a hole in the file; the client should resume from offset
+            self.send_error(409, "Chunk starts past the received data")
+            return
+        
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        with os.fdopen(os.open(temp_path, flags, 0o666), 'wb', buffering=CHUNK_SIZE) as f:
+            if start == 0 and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, total)
+                except OSError:
+                    pass  # Not supported on this filesystem
+            f.seek(start)
+            received = self.copy_body_to(f, content_length)
+        if received < content_length:
+            log.error("❌ Chunk incomplete: %s (%d/%d bytes)", filename, received, content_length)
+            self.send_error(400, "Chunk incomplete")
+            return
+        
+        complete = end + 1 == total
+        with upload_offsets_lock:
+            if complete:
+                upload_offsets.pop(temp_path, None)
+                completed_uploads[temp_path] = (total, time.monotonic())
+            else:
+                upload_offsets[temp_path] = (max(offset, end + 1), time.monotonic())
+        if complete:
+            os.replace(temp_path, file_path)
+            invalidate_files_cache()
+            log.info("✅ File saved: %s (%s)", filename, format_file_size(total))
+        
+        self.send_json({
+            'success': True,
+            'filename': filename,
+            'size': end + 1,
+            'complete': complete
+        })
+    
+    def stream_to_file(self, file_path, content_length):
+        """Copy content_length bytes of the request body to file_path. Returns bytes written.
+
+        The body is written to a hidden temp file that replaces file_path only once
+        complete, so concurrent uploads of the same name never interleave and a
+        failed upload leaves any existing file untouched.
+        """
+        fd, temp_path = create_exclusive_temp(file_path)
+        try:
+            with os.fdopen(fd, 'wb', buffering=CHUNK_SIZE) as f:
+                # Reserve the full size up front so the filesystem can lay it out contiguously
+                if hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, content_length)
+                    except OSError:
+                        pass  # Not supported on this filesystem
+                received = self.copy_body_to(f, content_length)
+            if received == content_length:
+                os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return received
+    
+    def copy_body_to(self, f, content_length):
+        """Copy up to content_length bytes of the request body into f. Returns bytes copied."""
+        remaining = content_length
+        buf = bytearray(min(CHUNK_SIZE, content_length))
+        mv = memoryview(buf)
+        while remaining > 0:
+            n = self.rfile.readinto(mv[:min(len(buf), remaining)])
+            if not n:
+                break  # Client disconnected mid-upload
+            f.write(mv[:n])
+            remaining -= n
+        return content_length - remaining
+    
+    def do_GET(self):
+        """Handle GET requests."""
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        
+        if path == '/':
+            self.serve_html()
+        elif path == '/files':
+            self.serve_files_list()
+        elif path == '/text':
+            self.serve_synced_text()
+        elif path == '/sync':
+            self.serve_sync_socket()
+        elif path.startswith('/download/'):
+            filename = urllib.parse.unquote(path[10:])
+            self.serve_file_download(filename)
+        else:
+            self.send_error(404)
+    
+    def do_HEAD(self):
+        """Handle HEAD requests: same headers as GET, no body."""
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        
+        if path == '/':
+            self.serve_html(send_body=False)
+        elif path.startswith('/download/'):
+            filename = urllib.parse.unquote(path[10:])
+            self.serve_file_download(filename, send_body=False)
+        elif path.startswith('/upload/'):
+            filename = urllib.parse.unquote(path[8:])
+            self.serve_upload_offset(filename, parsed.query)
+        else:
+            self.send_error(404)
+    
+    def end_headers(self):
+        # Tell clients how long an idle connection stays open so they don't reuse a dead one
+        if not self.close_connection:
+            self.send_header('Keep-Alive', f'timeout={IDLE_TIMEOUT}')
+        super().end_headers()
+    
+    def handle_expect_100(self):
+        # The interim reply must reach the client now, not sit in the write
+        # buffer until the final response; and it carries no Keep-Alive header
+        self.send_response_only(100)
+        super().end_headers()
+        self.wfile.flush()
+        return True
+    
+    def send_json(self, obj):
+        """Send obj as a 200 JSON response."""
+        body = encode_json(obj)
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def serve_synced_text(self):
+        """Serve the synced text."""
+        self.send_json({'text': synced_text})
+    
+    def serve_upload_offset(self, filename, query):
+        """Report in X-Offset how much of a chunked upload has arrived, for resuming.
+
+        A finished upload reports its total size, so the client stops there.
+        """
+        upload_id = urllib.parse.parse_qs(query).get('id', [''])[0]
+        if not UPLOAD_ID_RE.match(upload_id):
+            self.send_error(400, "Invalid upload id")
+            return
+        temp_path = chunk_temp_path(os.path.basename(filename), upload_id)
+        with upload_offsets_lock:
+            if temp_path in completed_uploads:
+                offset = completed_uploads[temp_path][0]
+            else:
+                offset = upload_offsets.get(temp_path, (0, 0))[0]
+        self.send_response(200)
+        self.send_header('X-Offset', str(offset))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def serve_sync_socket(self):
+        """Upgrade to a WebSocket carrying text both ways and clipboard photos up.
+
+        Client messages are JSON: {"type": "text", "value", "id"},
+        {"type": "textdiff", "base", "at", "remove", "insert", "id"} or
+        {"type": "clipboard", "id"} followed by one binary frame with the
+        image. Each is answered with {"type": "ack", "id", "success"}; text
+        acks also carry the resulting "version". {"type": "ping"} is a
+        keepalive and gets no reply.
+        """
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key or self.headers.get('Upgrade', '').lower() != 'websocket':
+            self.send_error(400, "Expected a WebSocket upgrade")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.close_connection = True
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        
+        # A sync socket stays open for the whole session; don't count it as a worker
+        self.release_worker_slot()
+        sock = SyncSocket(self.rfile, self.wfile)
+        with synced_text_lock:
+            sync_sockets.add(sock)
+            text, version = synced_text, synced_text_version
+        try:
+            sock.send_json({'type': 'text', 'value': text, 'version': version})
+            while True:
+                message = sock.receive()
+                if message is None:
+                    break
+                opcode, payload = message
+                if opcode != WS_TEXT:
+                    continue
+                try:
+                    msg = decode_json(payload)
+                except ValueError:
+                    msg = None
+                if not valid_sync_message(msg):
+                    # Refuse it without touching the synced text; keep the channel open
+                    log.warning("⚠️ Ignoring malformed sync message")
+                    msg_id = msg.get('id') if isinstance(msg, dict) else None
+                    sock.send_json({'type': 'ack', 'id': msg_id, 'success': False,
+                                    'error': 'Malformed message'})
+                    continue
+                kind = msg['type']
+                if kind == 'ping':
+                    continue  # Client keepalive; reading it resets the idle timeout
+                if kind == 'text':
+                    version = set_synced_text(msg['value'], source=sock)
+                    log.info("📝 Text synced: %d characters", len(msg['value']))
+                    sock.send_json({'type': 'ack', 'id': msg.get('id'), 'success': True,
+                                    'version': version})
+                elif kind == 'textdiff':
+                    # Stale diffs are refused; the client then sends the full text
+                    version = patch_synced_text(msg['base'], msg['at'], msg['remove'],
+                                                msg['insert'], source=sock)
+                    if version is not None:
+                        log.info("📝 Text synced: %d characters", len(synced_text))
+                    sock.send_json({'type': 'ack', 'id': msg.get('id'),
+                                    'success': version is not None, 'version': version})
+                elif kind == 'clipboard':
+                    image = sock.receive()
+                    if image is None:
+                        break
+                    success, error = copy_image_data_to_clipboard(image[1])
+                    if success:
+                        log.info("✅ Photo copied to clipboard! (%d bytes)", len(image[1]))
+                    else:
+                        log.error("❌ Clipboard error: %s", error)
+                    sock.send_json({'type': 'ack', 'id': msg.get('id'),
+                                    'success': success, 'error': error})
+        except (OSError, ValueError) as e:
+            log.error("❌ Sync channel error: %s", e)
+        finally:
+            with synced_text_lock:
+                sync_sockets.discard(sock)
+    
+    def serve_files_list(self):
+        """Serve JSON list of files."""
+        body, gzipped = get_files_json()
+        use_gzip = gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if use_gzip:
+            body = gzipped
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def serve_file_download(self, filename, send_body=True):
+        """Serve a file for download, honouring Range and If-None-Match."""
+        # Sanitize filename to prevent directory traversal
+        filename = os.path.basename(filename)
+        file_path = os.path.join(DOWNLOADS_FOLDER, filename)
+        
+        if not os.path.exists(file_path) or not os.path.isfile(file_path):
+            self.send_error(404, "File not found")
+            return
+        
+        try:
+            # Unbuffered: sendfile/mmap read the file directly, the page cache does the rest
+            with open(file_path, 'rb', buffering=0) as f:
+                st = os.fstat(f.fileno())
+                file_size = st.st_size
+                etag = f'"{st.st_mtime_ns:x}-{file_size:x}"'
+                
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                
+                start, end = 0, file_size - 1
+                status = 200
+                range_header = self.headers.get('Range')
+                # If-Range: only resume if the file is still the same version
+                if range_header and self.headers.get('If-Range', etag) == etag:
+                    try:
+                        byte_range = parse_byte_range(range_header, file_size)
+                    except ValueError:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{file_size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    if byte_range:
+                        start, end = byte_range
+                        status = 206
+                
+                mime_type = MIME_TYPES.get(get_extension(filename), 'application/octet-stream')
+                
+                # Encode filename for Content-Disposition header (RFC 5987 for Unicode support)
+                if filename.isascii() and '"' not in filename and '\\' not in filename:
+                    # Plain ASCII names go out as-is
+                    content_disposition = f'attachment; filename="{filename}"'
+                else:
+                    # Use RFC 5987 encoding for Unicode (or quote-breaking) filenames
+                    encoded_filename = urllib.parse.quote(filename, safe='')
+                    content_disposition = f"attachment; filename*=UTF-8''{encoded_filename}"
+                
+                self.send_response(status)
+                self.send_header('Content-Type', mime_type)
+                self.send_header('Content-Length', str(end - start + 1))
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Disposition', content_disposition)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+                self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Filename')
+                self.send_header('Access-Control-Expose-Headers', 'Content-Disposition, Content-Length, Content-Range')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                
+                if not send_body:
+                    return
+                self.send_file_body(f, start, end - start + 1)
+            
+            log.info("📤 Downloaded: %s", filename)
+            
+        except Exception as e:
+            log.error("❌ Download error: %s", e)
+            self.send_error(500, str(e))
+    
+    def send_file_body(self, f, offset, count):
+        """Send count bytes of f from offset, zero-copy via sendfile where available."""
+        if hasattr(os, 'sendfile') and SYSTEM != 'Windows':
+            # Cork (Linux) so the buffered headers go out with the first file pages
+            # instead of as their own small segment under TCP_NODELAY
+            cork = getattr(socket, 'TCP_CORK', None)
+            if cork is not None:
+                self.connection.setsockopt(socket.IPPROTO_TCP, cork, 1)
+            try:
+                # socket.sendfile handles partial sends and platform differences
+                self.wfile.flush()
+                self.connection.sendfile(f, offset, count)
+            finally:
+                if cork is not None:
+                    try:
+                        self.connection.setsockopt(socket.IPPROTO_TCP, cork, 0)
+                    except OSError:
+                        pass  # Connection already gone
+            return
+        
+        if MMAP_MIN_SIZE <= count <= MMAP_MAX_SIZE:
+            # Hand the mapped pages to the socket in one write, no read copies
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)[offset:offset + count]
+                try:
+                    self.wfile.write(view)
+                finally:
+                    view.release()
+            return
+        
+        # Fallback: stream file in chunks through one reused buffer
+        f.seek(offset)
+        buf = bytearray(min(CHUNK_SIZE, count))
+        mv = memoryview(buf)
+        while count > 0:
+            n = f.readinto(mv[:min(len(buf), count)])
+            if not n:
+                break
+            self.wfile.write(mv[:n])
+            count -= n
+    
+    def do_OPTIONS(self):
+        """Handle CORS preflight."""
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Filename')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def serve_html(self, send_body=True):
+        """Serve the main HTML page (gzipped when the client accepts it)."""
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body, etag = (HTML_GZIP, HTML_GZIP_ETAG) if use_gzip else (HTML_BYTES, HTML_ETAG)
+        
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        # Reuse the page for a minute without asking; revalidate by ETag after that
+        self.send_header('Cache-Control', 'public, max-age=60')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
 
     def log_message(self, format, *args):
         """Custom log format."""
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] {args[0]}")
+        log.info("[%s] %s", time.strftime('%H:%M:%S'), args[0])
+
+
+class SyncServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server with Nagle disabled on accepted sockets.
+
+    At most MAX_WORKERS requests are served at once (see
+    FileTransferHandler.parse_request); a request that can't get a worker
+    within WORKER_WAIT_TIMEOUT is answered with 503. Idle keep-alive
+    connections and open /sync sockets don't count.
+    """
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        self.worker_slots = threading.BoundedSemaphore(MAX_WORKERS)
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        # Socket buffer sizes are left to the kernel: a fixed SO_SNDBUF/SO_RCVBUF
+        # disables autotuning, which grows them further on a fast LAN
+        try:
+            request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass  # Tuning is best-effort; keep OS defaults
+        super().process_request(request, client_address)
+
+
+class DualStackSyncServer(SyncServer):
+    """SyncServer listening on IPv6 and IPv4 (v4-mapped) at once."""
+    address_family = socket.AF_INET6
+
+    def server_bind(self):
+        try:
+            self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        except (AttributeError, OSError):
+            pass
+        super().server_bind()
 
 
+def create_server():
+    """Bind dual-stack when IPv6 is available, otherwise IPv4 only."""
+    if socket.has_ipv6:
+        try:
+            return DualStackSyncServer(('::', PORT), FileTransferHandler)
+        except OSError as e:
+            if e.errno == errno.EADDRINUSE:
+                raise
+    return SyncServer(('0.0.0.0', PORT), FileTransferHandler)
+
+
+@functools.lru_cache(maxsize=None)
 def get_local_ip():
-    """Get the local IP address."""
+    """Get the local IP address (looked up once)."""
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "localhost"
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            # No packet is sent; connect() only picks the outgoing interface
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        pass
+    # No default route (e.g. a hotspot without internet): ask the resolver
+    try:
+        for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+            ip = info[4][0]
+            if not ip.startswith('127.'):
+                return ip
+    except OSError:
+        pass
+    return "localhost"
+
+
+def setup_logging():
+    """Send log records through a queue to stdout. Returns the started listener."""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    listener.start()
+    return listener
 
 
 def main():
+    log_listener = setup_logging()
     local_ip = get_local_ip()
 
     print("\n" + "="*50)
@@ -1799,17 +3260,25 @@ def main():
     print(f"\n📱 Open this URL on your phone's browser")
     print(f"📂 Files will be saved to: {DOWNLOADS_FOLDER}")
     print(f"📸 Camera photos will be copied to clipboard")
+    if start_downloads_watcher():
+        print("👀 Watching Downloads for changes")
     print("\n" + "="*50)
     print("Waiting for connections...\n")
 
-    server = http.server.HTTPServer(('0.0.0.0', PORT), FileTransferHandler)
-    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Reclaim space reserved by uploads the phone never finished
+    threading.Thread(target=expire_stale_uploads_loop, daemon=True).start()
+
+    # One thread per connection so a large upload doesn't block the UI
+    # SO_REUSEADDR is set before bind via HTTPServer.allow_reuse_address
+    server = create_server()
 
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n\n👋 Server stopped.")
         server.shutdown()
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":